@@ -3,14 +3,35 @@
 # ===============================================
 
 import streamlit as st
+from streamlit_autorefresh import st_autorefresh
 import pandas as pd
-import yfinance as yf
 import numpy as np
+from numba import njit, prange
 import re
+import orjson
+import asyncio
+import aiohttp
 import requests
-import time
-import random
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
+import urllib.parse
+import tempfile
+from datetime import date
+from pathlib import Path
+
+HTTP_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
+}
+# Generated from nse_fno_list.csv; rerun scripts/convert_fno_list.py after editing the CSV
+FNO_PARQUET = "nse_fno_list.parquet"
+YAHOO_CHART_URL = "https://query1.finance.yahoo.com/v8/finance/chart/{ticker}"
+# Prices stay float64 so paise survive on high-priced stocks (float32 steps by ~0.016 above 1 lakh)
+PRICE_DTYPE = np.float64
+CACHE_DIR = Path(".yf_cache")
+CACHE_FRESHNESS = "5min"
+# '&' and '-' are part of real NSE symbols such as M&M and BAJAJ-AUTO
+_SYMBOL_JUNK_RE = re.compile(r'[^A-Za-z0-9&-]')
 
 # ===============================================
 # Page Config
@@ -20,152 +41,277 @@ st.set_page_config(page_title="Pro Options Dashboard", layout="wide", initial_si
 st.title("🚀 Pro Options Trading Dashboard (Full Version)")
 
 refresh_time = st.sidebar.slider("Refresh Interval (seconds)", 10, 300, 60)
+# Client-side timer: reruns the script without blocking the worker between refreshes
+st_autorefresh(interval=refresh_time * 1000, key="datarefresh")
 
 # ===============================================
 # Helper Functions
 # ===============================================
 
+def canonical_symbol(sym):
+    """Normalize a symbol to its bare NSE form, e.g. ' m&m.ns ' -> 'M&M'."""
+    return _SYMBOL_JUNK_RE.sub('', str(sym).strip().upper().removesuffix(".NS"))
+
 @st.cache_data(ttl=300)
 def load_fno_symbols():
     try:
-        fno_list = pd.read_csv("nse_fno_list.csv")
-        fno_list.columns = fno_list.columns.str.strip().str.upper()
-        if 'SYMBOL' not in fno_list.columns:
-            st.error("Error: 'SYMBOL' column not found in FNO list.")
-            st.stop()
-        symbols = fno_list['SYMBOL'].dropna().unique().tolist()
-
-        # Clean: remove anything except letters and numbers
-        clean_symbols = []
-        for sym in symbols:
-            sym = re.sub(r'[^A-Za-z0-9]', '', sym)  # Remove non-alphanumerics
-            if sym:
-                clean_symbols.append(sym)
-        return clean_symbols
+        fno_list = pd.read_parquet(FNO_PARQUET, columns=['SYMBOL'])
+        # Canonicalize and dedupe so each underlying is fetched exactly once
+        symbols = {canonical_symbol(sym) for sym in fno_list['SYMBOL'].dropna()}
+        return sorted(sym for sym in symbols if sym)
     except FileNotFoundError:
-        st.error("Error: 'nse_fno_list.csv' file not found.")
+        st.error(f"Error: '{FNO_PARQUET}' file not found.")
         st.stop()
     except Exception as e:
         st.error(f"Unexpected error loading FNO symbols: {e}")
         st.stop()
 
-@st.cache_data(ttl=300)
-def validate_symbols(symbols, max_retries=3, delay=0.75, backup_file="validated_symbols.csv"):
-    """Validate Yahoo symbols with rate-limit handling + backup caching."""
-
-    if os.path.exists(backup_file):
-        try:
-            cached = pd.read_csv(backup_file)
-            cached_symbols = cached['SYMBOL'].dropna().unique().tolist()
-            st.success(f"Loaded {len(cached_symbols)} cached validated symbols.")
-            return cached_symbols
-        except Exception as e:
-            st.warning(f"Backup cache failed to load: {e}. Rebuilding...")
-
-    st.info("Running validation (may take time due to rate limits)...")
-    valid_symbols = []
-
+def _parse_chart(payload):
+    """Turn a Yahoo chart payload into a (close/high/low x days) array."""
+    result = payload['chart']['result']
+    if not result:
+        return np.empty((3, 0), dtype=PRICE_DTYPE)
+    quote = result[0]['indicators']['quote'][0]
+    bars = np.array([quote.get(field, []) for field in ("close", "high", "low")], dtype=PRICE_DTYPE)
+    # Yahoo reports missing bars as nulls; keep only days with a close
+    return bars[:, ~np.isnan(bars[0])]
+
+async def _fetch_chart(http, symbol, period):
+    async with http.get(
+        YAHOO_CHART_URL.format(ticker=urllib.parse.quote(symbol + ".NS")),
+        params={"range": period, "interval": "1d"}
+    ) as response:
+        # Unknown symbols get a 404 whose body still holds the chart JSON with no result
+        if response.status != 404:
+            response.raise_for_status()
+        return _parse_chart(orjson.loads(await response.read()))
+
+async def _fetch_charts(symbols, period, max_workers):
+    """Fetch chart data for all symbols concurrently over one pooled aiohttp session.
+
+    Failed symbols come back as their exception instead of an array.
+    """
+    limit = asyncio.Semaphore(max_workers)
+
+    async def fetch(http, symbol):
+        async with limit:
+            return await _fetch_chart(http, symbol, period)
+
+    connector = aiohttp.TCPConnector(limit=16, ttl_dns_cache=300)
+    async with aiohttp.ClientSession(
+        connector=connector,
+        headers=HTTP_HEADERS,
+        timeout=aiohttp.ClientTimeout(total=10)
+    ) as http:
+        return await asyncio.gather(*(fetch(http, symbol) for symbol in symbols), return_exceptions=True)
+
+def _cache_bucket():
+    """Freshness key for the disk cache, aligned with the 5 minute cache_data TTL."""
+    return pd.Timestamp.now().floor(CACHE_FRESHNESS).strftime("%Y%m%d_%H%M")
+
+def _prune_history_cache(bucket):
+    for path in CACHE_DIR.iterdir():
+        if not path.stem.endswith(bucket):
+            path.unlink(missing_ok=True)
+
+def _save_history(path, bars):
+    """Write bars via a temp file so concurrent readers never see a partial file."""
+    # The temp stem still ends with the bucket so pruning only removes stale leftovers
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, prefix=".", suffix=f"_{path.stem}.tmp")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            np.save(tmp, bars)
+        os.replace(tmp_path, path)
+    except Exception:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+def _cached_history(symbols, period, max_workers=8):
+    """Per-symbol daily bars that survive Streamlit reruns via an on-disk cache.
+
+    Only symbols missing from the current cache bucket hit the network.
+    """
+    CACHE_DIR.mkdir(exist_ok=True)
+    bucket = _cache_bucket()
+    histories = {}
+    misses = []
     for symbol in symbols:
-        retries = 0
-        success = False
-        curr_delay = delay
-
-        while retries < max_retries:
+        try:
+            histories[symbol] = np.load(CACHE_DIR / f"{symbol}_{period}_{bucket}.npy")
+        except Exception:
+            # Missing, pruned by another session or unreadable: fetch it again
+            misses.append(symbol)
+
+    if misses:
+        _prune_history_cache(bucket)
+        results = asyncio.run(_fetch_charts(misses, period, max_workers))
+        for symbol, bars in zip(misses, results):
+            if isinstance(bars, Exception):
+                st.warning(f"Skipped {symbol}: {bars!r}")
+                continue
             try:
-                ticker = yf.Ticker(symbol + ".NS")
-                hist = ticker.history(period="1d")
-                if not hist.empty:
-                    valid_symbols.append(symbol)
-                    success = True
-                    break
+                # Empty histories are cached too so invalid symbols are not re-fetched
+                _save_history(CACHE_DIR / f"{symbol}_{period}_{bucket}.npy", bars)
             except Exception as e:
-                if "too many requests" in str(e).lower():
-                    st.warning(f"Rate limited on {symbol}. Retrying in {curr_delay:.1f}s...")
-                    time.sleep(curr_delay)
-                    curr_delay *= 1.5
-                    retries += 1
-                else:
-                    st.warning(f"Validation error for {symbol}: {e}")
-                    break
-
-        time.sleep(random.uniform(0.5, 1.0))
-
-    if valid_symbols:
-        try:
-            pd.DataFrame({"SYMBOL": valid_symbols}).to_csv(backup_file, index=False)
-            st.success(f"Saved validated symbols to {backup_file}")
-        except Exception as e:
-            st.warning(f"Failed to write backup: {e}")
+                st.warning(f"Failed to cache history for {symbol}: {e}")
+            histories[symbol] = bars
 
-    return valid_symbols
+    return {symbol: histories[symbol] for symbol in symbols if symbol in histories}
+
+def load_validated_symbols(backup_file="validated_symbols.csv"):
+    """Return today's validated symbols from the backup file, or None if stale or missing."""
+    if not os.path.exists(backup_file):
+        return None
+    try:
+        cached = pd.read_csv(backup_file)
+        if 'DATE' not in cached.columns or (cached['DATE'] != str(date.today())).any():
+            return None
+        return cached['SYMBOL'].dropna().unique().tolist()
+    except Exception as e:
+        st.warning(f"Backup cache failed to load: {e}. Rebuilding...")
+        return None
+
+def save_validated_symbols(symbols, backup_file="validated_symbols.csv"):
+    if not symbols:
+        return
+    try:
+        pd.DataFrame({"SYMBOL": symbols, "DATE": str(date.today())}).to_csv(backup_file, index=False)
+    except Exception as e:
+        st.warning(f"Failed to write backup: {e}")
+
+# Breakout signal bits emitted by the kernel
+ABOVE_EMA = 1
+ABOVE_HIGH = 2
+BELOW_LOW = 4
+BULLISH = ABOVE_EMA | ABOVE_HIGH
+SIGNAL_NAMES = ((ABOVE_EMA, "Above 20EMA"), (ABOVE_HIGH, "Above Yesterday High"), (BELOW_LOW, "Below Yesterday Low"))
+SIGNAL_LABELS = np.array([" | ".join(name for bit, name in SIGNAL_NAMES if mask & bit) for mask in range(8)], dtype=object)
+
+@njit(cache=True)
+def _ema_last(x, alpha):
+    """Last value of the one-pole EMA recursion, matching ewm(adjust=False)."""
+    # Skip the NaN padding of symbols with a shorter history
+    first = 0
+    while np.isnan(x[first]):
+        first += 1
+    s = x[first]
+    for j in range(first + 1, x.shape[0]):
+        # Same as alpha * x + (1 - alpha) * s, but stays in the input precision
+        s += alpha * (x[j] - s)
+    return s
+
+@njit(parallel=True, cache=True)
+def _breakout_kernel(closes, highs, lows, alpha):
+    """Return the last EMA and signal bitmask for each row of (symbols x days) arrays."""
+    n, t = closes.shape
+    ema = np.empty(n, closes.dtype)
+    sig = np.zeros(n, np.uint8)
+    for i in prange(n):
+        s = _ema_last(closes[i], alpha)
+        ema[i] = s
+        c = closes[i, t - 1]
+        if c > s:
+            sig[i] |= ABOVE_EMA
+        if c > highs[i, t - 2]:
+            sig[i] |= ABOVE_HIGH
+        if c < lows[i, t - 2]:
+            sig[i] |= BELOW_LOW
+    return ema, sig
+
+def _stack_histories(histories):
+    """Right-align per-symbol bars into (symbols x days) close, high and low arrays.
+
+    Symbols with fewer days are left-padded with NaN.
+    """
+    days = max(bars.shape[1] for bars in histories.values())
+    panel = np.full((3, len(histories), days), np.nan, dtype=PRICE_DTYPE)
+    for i, bars in enumerate(histories.values()):
+        panel[:, i, days - bars.shape[1]:] = bars
+    return panel
 
 @st.cache_data(ttl=300)
-def get_breakout_screener(symbols):
-    breakout_data = []
-    for symbol in symbols:
-        try:
-            ticker = yf.Ticker(symbol + ".NS")
-            hist = ticker.history(period="5d")
-            if hist.empty:
-                continue
-            current = hist["Close"].iloc[-1]
-            yesterday_high = hist["High"].iloc[-2]
-            yesterday_low = hist["Low"].iloc[-2]
-            ema20 = hist['Close'].ewm(span=20, adjust=False).mean().iloc[-1]
-            signal = ""
-            if current > ema20:
-                signal += "Above 20EMA | "
-            if current > yesterday_high:
-                signal += "Above Yesterday High | "
-            if current < yesterday_low:
-                signal += "Below Yesterday Low | "
-            breakout_data.append((
-                symbol,
-                current,
-                ema20,
-                yesterday_high,
-                yesterday_low,
-                signal.strip(' | ')
-            ))
-        except Exception as e:
-            st.warning(f"Skipped {symbol}: {e}")
-    df = pd.DataFrame(breakout_data, columns=["Stock", "Current Price", "20 EMA", "Prev High", "Prev Low", "Signal"])
-    return df
-
-def highlight_signal(val):
-    if isinstance(val, str):
-        if "Above" in val:
-            return 'background-color: lightgreen; font-weight: bold'
-        elif "Below" in val:
-            return 'background-color: lightcoral; font-weight: bold'
+def get_breakout_screener(symbols, max_workers=8):
+    """Scan symbols for breakouts using Yahoo chart data.
+
+    Returns the screener frame, the symbols not known to be invalid (only those
+    Yahoo returned no history for are dropped) and whether every fetch succeeded.
+    ``max_workers`` caps in-flight chart requests; lower it to throttle
+    requests if Yahoo starts rate-limiting.
+    """
+    if st.get_option("global.developmentMode") and len(set(symbols)) != len(symbols):
+        st.warning("Duplicate symbols passed to the breakout screener; they will be fetched twice.")
+    histories = _cached_history(symbols, period="5d", max_workers=max_workers)
+    # Symbols whose fetch failed are missing from histories; keep them for a retry
+    valid_symbols = [symbol for symbol in symbols if symbol not in histories or histories[symbol].size]
+    fetched_all = len(histories) == len(symbols)
+    # A breakout needs today's close and yesterday's range
+    histories = {symbol: bars for symbol, bars in histories.items() if bars.shape[1] >= 2}
+    if not histories:
+        screener_df = pd.DataFrame(columns=["Stock", "Current Price", "20 EMA", "Prev High", "Prev Low", "Signal", "Signal Bits"])
+        return screener_df, valid_symbols, fetched_all
+
+    closes, highs, lows = _stack_histories(histories)
+    ema20, signal_bits = _breakout_kernel(closes, highs, lows, PRICE_DTYPE(2 / (20 + 1)))
+
+    screener_df = pd.DataFrame({
+        "Stock": list(histories),
+        "Current Price": closes[:, -1],
+        "20 EMA": ema20,
+        "Prev High": highs[:, -2],
+        "Prev Low": lows[:, -2],
+        "Signal": SIGNAL_LABELS[signal_bits],
+        "Signal Bits": signal_bits
+    })
+    return screener_df, valid_symbols, fetched_all
+
+def highlight_signal(bits):
+    if bits & BULLISH:
+        return 'background-color: lightgreen; font-weight: bold'
+    elif bits & BELOW_LOW:
+        return 'background-color: lightcoral; font-weight: bold'
     return ''
 
+SIGNAL_CSS = np.array([highlight_signal(mask) for mask in range(8)], dtype=object)
+
+def _prime_nse_session(session):
+    """NSE only serves its API to clients holding cookies from the home page."""
+    session.get("https://www.nseindia.com/", timeout=10)
+
+@st.cache_resource
+def get_session():
+    """Shared HTTP session so NSE connections are reused across reruns."""
+    session = requests.Session()
+    session.headers.update(HTTP_HEADERS)
+    adapter = HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=32,
+        max_retries=Retry(total=3, backoff_factor=0.3)
+    )
+    session.mount("https://", adapter)
+    return session
+
 @st.cache_data(ttl=300)
 def fetch_option_chain(symbol):
     """Fetch simple option chain from NSE"""
     try:
-        url = f"https://www.nseindia.com/api/option-chain-equities?symbol={symbol.upper()}"
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
-        }
-        session = requests.Session()
-        session.headers.update(headers)
-        response = session.get(url, timeout=10)
-        data = response.json()
-        records = data['records']['data']
-        options = []
-        for item in records:
-            if 'CE' in item and 'PE' in item:
-                ce = item['CE']
-                pe = item['PE']
-                options.append({
-                    'Strike Price': ce.get('strikePrice'),
-                    'Call Price': ce.get('lastPrice'),
-                    'Call OI': ce.get('openInterest'),
-                    'Put Price': pe.get('lastPrice'),
-                    'Put OI': pe.get('openInterest')
-                })
-        return pd.DataFrame(options)
+        url = f"https://www.nseindia.com/api/option-chain-equities?symbol={urllib.parse.quote(symbol.upper())}"
+        # Primed lazily so a slow NSE never delays the rest of the dashboard
+        if not SESSION.cookies:
+            _prime_nse_session(SESSION)
+        response = SESSION.get(url, timeout=10)
+        if response.status_code in (401, 403):
+            # NSE cookies expire; refresh them once and retry
+            _prime_nse_session(SESSION)
+            response = SESSION.get(url, timeout=10)
+        data = orjson.loads(response.content)
+        records = [item for item in data['records']['data'] if 'CE' in item and 'PE' in item]
+        return pd.DataFrame({
+            'Strike Price': [item['CE'].get('strikePrice') for item in records],
+            'Call Price': [item['CE'].get('lastPrice') for item in records],
+            'Call OI': [item['CE'].get('openInterest') for item in records],
+            'Put Price': [item['PE'].get('lastPrice') for item in records],
+            'Put OI': [item['PE'].get('openInterest') for item in records]
+        })
     except Exception as e:
         st.error(f"Option Chain fetch error: {e}")
         return pd.DataFrame()
@@ -174,9 +320,21 @@ def fetch_option_chain(symbol):
 # Load Valid Symbols
 # ===============================================
 
+SESSION = get_session()
+
 st.info("Loading FNO symbols and validating against Yahoo Finance...")
 symbols = load_fno_symbols()
-symbols = validate_symbols(symbols)
+validated = load_validated_symbols()
+
+# Symbols are validated implicitly by the screener's own fetch
+screener_df, valid_symbols, fetched_all = get_breakout_screener(validated or symbols)
+if validated:
+    symbols = validated
+else:
+    symbols = valid_symbols
+    # Don't pin today's list on transient failures; they are retried on the next run
+    if fetched_all:
+        save_validated_symbols(symbols)
 
 st.success(f"Loaded {len(symbols)} valid F&O symbols.")
 
@@ -187,17 +345,17 @@ st.success(f"Loaded {len(symbols)} valid F&O symbols.")
 # --- Section 1: Breakout Screener ---
 st.header("📈 Top 10 NSE F&O Breakout Screener")
 
-screener_df = get_breakout_screener(symbols)
-filtered_df = screener_df[screener_df['Signal'] != ""]
+filtered_df = screener_df[screener_df['Signal Bits'] != 0]
 top_breakouts = filtered_df.sort_values(by="Current Price", ascending=False).head(10)
+signal_bits = top_breakouts['Signal Bits'].to_numpy(dtype=np.uint8)
 
 st.dataframe(
-    top_breakouts.style.format({
+    top_breakouts.drop(columns="Signal Bits").style.format({
         "Current Price": "{:.2f}",
         "20 EMA": "{:.2f}",
         "Prev High": "{:.2f}",
         "Prev Low": "{:.2f}"
-    }).map(highlight_signal, subset=["Signal"]),
+    }).apply(lambda col: SIGNAL_CSS[signal_bits], subset=["Signal"]),
     use_container_width=True
 )
 
@@ -206,25 +364,18 @@ st.divider()
 # --- Section 2: Top 5 Options Screener (Intraday & Monthly) ---
 st.header("🔥 Top 5 Stock Options Screener")
 
-option_screener = []
-
-for idx, row in top_breakouts.iterrows():
-    spot_price = row['Current Price']
-    strike_price = round(spot_price / 50) * 50
-    option_type = "CALL" if "Above" in row['Signal'] else "PUT"
-    stop_loss = round(spot_price * 0.98, 2) if option_type == "CALL" else round(spot_price * 1.02, 2)
-    expiry_type = "Weekly (Intraday)" if spot_price < 1000 else "Monthly"
-
-    option_screener.append({
-        "Stock": row['Stock'],
-        "Option Type": option_type,
-        "Current Price": spot_price,
-        "Best Strike Price": strike_price,
-        "Suggested Stop Loss": stop_loss,
-        "Expiry": expiry_type
-    })
-
-option_df = pd.DataFrame(option_screener)
+# Round to paise so derived levels display cleanly
+spot_price = top_breakouts['Current Price'].round(2)
+option_type = np.where(signal_bits & BULLISH, "CALL", "PUT")
+
+option_df = pd.DataFrame({
+    "Stock": top_breakouts['Stock'].values,
+    "Option Type": option_type,
+    "Current Price": spot_price.values,
+    "Best Strike Price": ((spot_price / 50).round() * 50).astype(int).values,
+    "Suggested Stop Loss": np.where(option_type == "CALL", (spot_price * 0.98).round(2), (spot_price * 1.02).round(2)),
+    "Expiry": np.where(spot_price < 1000, "Weekly (Intraday)", "Monthly")
+})
 st.dataframe(option_df, use_container_width=True)
 
 st.divider()
@@ -232,11 +383,18 @@ st.divider()
 # --- Section 3: Live NSE Option Chain Viewer ---
 st.header("🔮 Live Option Chain Viewer")
 
-selected_stock = st.selectbox("Select Stock for Option Chain", symbols)
+# Widget changes don't hit NSE; only the submitted stock is fetched, refreshed via the 5 minute cache
+with st.form("option_chain_form"):
+    selected_stock = st.selectbox("Select Stock for Option Chain", symbols)
+    fetch_clicked = st.form_submit_button("Fetch Option Chain")
+
+if fetch_clicked and selected_stock:
+    st.session_state["option_chain_stock"] = selected_stock
 
-if selected_stock:
-    st.subheader(f"Live Option Chain: {selected_stock}")
-    option_chain_df = fetch_option_chain(selected_stock)
+if "option_chain_stock" in st.session_state:
+    chain_stock = st.session_state["option_chain_stock"]
+    option_chain_df = fetch_option_chain(chain_stock)
+    st.subheader(f"Live Option Chain: {chain_stock}")
     if not option_chain_df.empty:
         st.dataframe(option_chain_df, use_container_width=True)
     else:
@@ -260,4 +418,4 @@ st.info("🔭 Strategy recommendations based on event dates coming soon!")
 # Footer
 # ===============================================
 
-st.info("🔄 Note: Please manually refresh (Ctrl+R) for latest data. Streamlit doesn't auto-refresh automatically.")
+st.info(f"🔄 Note: Dashboard auto-refreshes every {refresh_time} seconds (adjust in the sidebar).")
@@ -0,0 +1,20 @@
+# ===============================================
+# Regenerate nse_fno_list.parquet from nse_fno_list.csv
+# ===============================================
+# The dashboard only reads the parquet copy; run this after editing the CSV:
+#     python scripts/convert_fno_list.py
+
+import pandas as pd
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+FNO_CSV = ROOT / "nse_fno_list.csv"
+FNO_PARQUET = ROOT / "nse_fno_list.parquet"
+
+if __name__ == "__main__":
+    fno_list = pd.read_csv(FNO_CSV)
+    fno_list.columns = fno_list.columns.str.strip().str.upper()
+    # Drop blank rows before astype(str) turns them into the string 'nan'
+    fno_list = fno_list[['SYMBOL']].dropna().astype(str)
+    fno_list.to_parquet(FNO_PARQUET, index=False)
+    print(f"Wrote {len(fno_list)} symbols to {FNO_PARQUET.name}")